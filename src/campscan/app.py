@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import atexit
+import io
+from concurrent.futures import CancelledError
+from dataclasses import fields
 from datetime import date, timedelta
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import streamlit as st
 
-from campscan.scanner import ScanRequest, SearchSettings, scan_availability
+from campscan.scanner import AvailabilityRecord, BrowserSession, ScanRequest, SearchSettings, scan_availability
 
 st.set_page_config(page_title="Ontario Parks Campground Scanner", layout="wide")
 st.title("🏕️ Ontario Parks Campground Availability Scanner")
@@ -54,6 +60,49 @@ def parse_requests(raw: str) -> list[ScanRequest]:
     return requests
 
 
+def keep_browser_session(session: BrowserSession) -> bool:
+    """Cache validator: close a session whose browser has gone away before it is replaced."""
+    if session.is_connected():
+        return True
+    session.close()
+    return False
+
+
+@st.cache_resource
+def current_browser_session() -> dict[str, BrowserSession]:
+    """Hold whichever shared session is live so a single atexit hook closes it."""
+    current: dict[str, BrowserSession] = {}
+
+    def close_current() -> None:
+        session = current.pop("session", None)
+        if session is not None:
+            session.close()
+
+    atexit.register(close_current)
+    return current
+
+
+@st.cache_resource(validate=keep_browser_session)
+def get_browser_session() -> BrowserSession:
+    """Launch Chromium once per server process and share it across sessions and clicks."""
+    session = BrowserSession()
+    current_browser_session()["session"] = session
+    return session
+
+
+def records_to_frame(records: list[AvailabilityRecord]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {field.name: [getattr(record, field.name) for record in records] for field in fields(AvailabilityRecord)}
+    )
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Encode ``df`` as CSV with pyarrow's writer, which quotes every header and string cell."""
+    buffer = io.BytesIO()
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buffer)
+    return buffer.getvalue()
+
+
 if scan_button:
     if end_date <= start_date:
         st.error("Departure date must be after arrival date.")
@@ -74,19 +123,23 @@ if scan_button:
     )
 
     with st.spinner("Scanning Ontario Parks search pages..."):
-        records = scan_availability(requests, settings)
+        try:
+            records = scan_availability(requests, settings, session=get_browser_session())
+        except (TimeoutError, CancelledError):
+            st.error("The scan was interrupted before it finished. Please try again.")
+            st.stop()
 
     if not records:
         st.warning(
             "No availability records were detected. This can happen when the site blocks automation or changes response formats."
         )
     else:
-        df = pd.DataFrame([record.__dict__ for record in records])
+        df = records_to_frame(records)
         st.success(f"Found {len(df)} availability records.")
         st.dataframe(df, use_container_width=True)
         st.download_button(
             "Download results CSV",
-            data=df.to_csv(index=False).encode("utf-8"),
+            data=to_csv_bytes(df),
             file_name="ontario_parks_availability.csv",
             mime="text/csv",
         )
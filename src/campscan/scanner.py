@@ -1,24 +1,88 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import concurrent.futures
+import logging
 import re
-from collections.abc import Iterable
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Coroutine, Iterable
+from contextlib import suppress
+from dataclasses import dataclass, field
 from datetime import date
-from typing import Any
-from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
-
-from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
-from playwright.sync_api import sync_playwright
-
-
-@dataclass
+from functools import lru_cache, partial
+from typing import Any, TypeVar
+from urllib.parse import ParseResult, parse_qs, urlencode, urlparse, urlunparse
+
+import httpx
+import orjson
+from playwright.async_api import Browser, BrowserContext, Playwright, Route
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
+
+# The first navigation only waits for the server to answer; a server that has not answered by
+# then is retried once with the caller's full timeout. Either way the DOM is awaited afterwards.
+FIRST_GOTO_TIMEOUT_MS = 8_000
+# Upper bound on how long to wait for the first availability JSON once the DOM has loaded.
+RESPONSE_WAIT_MS = 5_000
+# After the first hit, keep collecting until no availability response has arrived for this long,
+# so paginated or per-loop responses are not cut off.
+RESPONSE_QUIET_MS = 1_500
+# Upper bound on that collection phase, for pages that poll availability indefinitely.
+RESPONSE_SETTLE_MAX_MS = 10_000
+# Short network-idle grace period before falling back to scraping the rendered text.
+TEXT_FALLBACK_IDLE_MS = 2_000
+# Bound on BrowserSession calls other than scans (launch, shutdown).
+SESSION_CALL_TIMEOUT_S = 30.0
+# Pages kept open against the reservation site at once; the rest queue on a shared context.
+MAX_CONCURRENT_PAGES = 4
+
+# Resource types the scanner never reads; aborting them keeps page loads to HTML, scripts and API calls.
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "stylesheet", "media"})
+# Only these requests are intercepted and inspected for availability JSON.
+API_RESOURCE_TYPES = frozenset({"xhr", "fetch"})
+
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+HTTP_TIMEOUT = httpx.Timeout(10.0)
+
+# Availability JSON endpoints observed during a browser scan, keyed by the built search URL and
+# mapping each endpoint URL to the request headers needed to replay it. Only GET requests are
+# recorded, since the replay is a plain GET with those headers.
+# Later scans of the same search hit these directly over HTTP instead of rendering the page.
+# Kept as an LRU so a long-running server does not grow it with every distinct search.
+MAX_CACHED_SEARCHES = 256
+_API_ENDPOINTS: OrderedDict[str, dict[str, dict[str, str]]] = OrderedDict()
+# Request headers the HTTP client manages itself and that are never replayed.
+_UNREPLAYED_HEADERS = frozenset({"host", "content-length", "connection", "accept-encoding", "user-agent", "cookie"})
+
+_AVAIL_URL_RE = re.compile(r"avail|camp|inventory|site|unit", re.IGNORECASE)
+_PAGE_TEXT_RE = re.compile(r"(Site\s*\w+[^\n]{0,40})\s+(Available|Sold\s*out|Not\s+available)", re.IGNORECASE)
+_NAME_KEYS = frozenset({"name", "unitname", "site", "sitename"})
+_STATUS_KEYS = frozenset({"status", "availability", "available", "isavailable"})
+# Exact-case spellings checked before lower-casing; a node must use at least one of them.
+_RAW_NAME_KEYS = frozenset({"name", "unitName", "unitname", "site", "siteName", "sitename"})
+_RAW_STATUS_KEYS = frozenset({"status", "availability", "available", "isAvailable", "isavailable"})
+_ANY_AVAIL_KEY = _RAW_NAME_KEYS | _RAW_STATUS_KEYS
+# Raw byte markers that any availability payload carries; bodies without them are never parsed.
+# Every record needs a status key, so these cover status/availability/available/isAvailable in
+# lower, title, camel and upper case.
+_AVAILABILITY_BODY_TOKENS = (b"tatus", b"vailab", b"TATUS", b"VAILAB")
+
+
+@dataclass(slots=True)
 class ScanRequest:
     name: str
     search_url: str
 
 
-@dataclass
+@dataclass(slots=True)
 class SearchSettings:
     start_date: date
     end_date: date
@@ -28,7 +92,7 @@ class SearchSettings:
     nights: int | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class AvailabilityRecord:
     campground: str
     source: str
@@ -38,18 +102,26 @@ class AvailabilityRecord:
 
 
 def _deep_iter(data: Any) -> Iterable[Any]:
-    if isinstance(data, dict):
-        yield data
-        for value in data.values():
-            yield from _deep_iter(value)
-    elif isinstance(data, list):
-        for item in data:
-            yield from _deep_iter(item)
+    """Yield every dict nested in ``data`` in pre-order without recursing."""
+    stack = deque([data])
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(reversed(node.values()))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+@lru_cache(maxsize=256)
+def _parse_base(url: str) -> tuple[ParseResult, dict[str, list[str]]]:
+    parsed = urlparse(url)
+    return parsed, parse_qs(parsed.query)
 
 
 def build_search_url(base_url: str, settings: SearchSettings) -> str:
-    parsed = urlparse(base_url)
-    query = parse_qs(parsed.query)
+    parsed, base_query = _parse_base(base_url)
+    query = dict(base_query)
 
     query["startDate"] = [settings.start_date.isoformat()]
     query["endDate"] = [settings.end_date.isoformat()]
@@ -67,12 +139,13 @@ def _extract_from_json_blob(blob: Any, campground: str, source: str) -> list[Ava
     records: list[AvailabilityRecord] = []
 
     for node in _deep_iter(blob):
-        keys = {key.lower() for key in node.keys()}
-
-        has_name = any(k in keys for k in ("name", "unitname", "site", "sitename"))
-        has_status = any(k in keys for k in ("status", "availability", "available", "isavailable"))
-        if not (has_name and has_status):
+        raw_keys = node.keys()
+        if _ANY_AVAIL_KEY.isdisjoint(raw_keys):
             continue
+        if _RAW_NAME_KEYS.isdisjoint(raw_keys) or _RAW_STATUS_KEYS.isdisjoint(raw_keys):
+            keys = {key.lower() for key in raw_keys}
+            if keys.isdisjoint(_NAME_KEYS) or keys.isdisjoint(_STATUS_KEYS):
+                continue
 
         unit_name = str(
             node.get("unitName")
@@ -93,7 +166,7 @@ def _extract_from_json_blob(blob: Any, campground: str, source: str) -> list[Ava
         )
 
         status = str(raw_status)
-        details = json.dumps(node, ensure_ascii=False)[:400]
+        details = orjson.dumps(node).decode("utf-8", errors="replace")[:400]
 
         records.append(
             AvailabilityRecord(
@@ -108,10 +181,19 @@ def _extract_from_json_blob(blob: Any, campground: str, source: str) -> list[Ava
     return records
 
 
+def _parse_availability_body(body: bytes) -> Any | None:
+    """Decode a JSON response body, or return ``None`` if it cannot hold availability data."""
+    if not any(token in body for token in _AVAILABILITY_BODY_TOKENS):
+        return None
+    try:
+        return orjson.loads(body)
+    except ValueError:
+        return None
+
+
 def _extract_from_page_text(page_text: str, campground: str) -> list[AvailabilityRecord]:
     records: list[AvailabilityRecord] = []
-    pattern = re.compile(r"(Site\s*\w+[^\n]{0,40})\s+(Available|Sold\s*out|Not\s+available)", re.IGNORECASE)
-    for match in pattern.finditer(page_text):
+    for match in _PAGE_TEXT_RE.finditer(page_text):
         unit, status = match.groups()
         records.append(
             AvailabilityRecord(
@@ -125,57 +207,345 @@ def _extract_from_page_text(page_text: str, campground: str) -> list[Availabilit
     return records
 
 
-def scan_availability(requests: list[ScanRequest], settings: SearchSettings, timeout_ms: int = 45_000) -> list[AvailabilityRecord]:
-    all_records: list[AvailabilityRecord] = []
-
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124 Safari/537.36"
-        )
+async def _block_heavy_resources(route: Route) -> None:
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
-        for request in requests:
-            page = context.new_page()
-            api_records: list[AvailabilityRecord] = []
 
-            def handle_response(response):
-                url_lower = response.url.lower()
-                if not any(token in url_lower for token in ("avail", "camp", "inventory", "site", "unit")):
-                    return
-                content_type = response.headers.get("content-type", "")
-                if "application/json" not in content_type:
-                    return
-                try:
-                    payload = response.json()
-                except Exception:
-                    return
+@dataclass(slots=True)
+class _PageCapture:
+    """Availability data collected from one page's API responses."""
 
-                extracted = _extract_from_json_blob(payload, request.name, response.url)
-                api_records.extend(extracted)
+    campground: str
+    records: dict[tuple[str, str], AvailabilityRecord] = field(default_factory=dict)
+    endpoints: dict[str, dict[str, str]] = field(default_factory=dict)
+    # Set whenever a response yields records; cleared by the waiter to detect a quiet period.
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def reset(self) -> None:
+        self.records.clear()
+        self.endpoints.clear()
+        self.ready.clear()
+
+
+async def _tap_availability(capture: _PageCapture, route: Route) -> None:
+    """Serve an availability-shaped API call to the page and inspect its body if it is JSON."""
+    if route.request.resource_type not in API_RESOURCE_TYPES:
+        await route.fallback()
+        return
+    try:
+        response = await route.fetch()
+        await route.fulfill(response=response)
+    except PlaywrightError:
+        with suppress(PlaywrightError):
+            await route.abort()
+        return
+
+    if "application/json" not in response.headers.get("content-type", ""):
+        return
+    try:
+        body = await response.body()
+    except PlaywrightError:
+        return
+    payload = _parse_availability_body(body)
+    if payload is None:
+        return
+
+    extracted = _extract_from_json_blob(payload, capture.campground, response.url)
+    if not extracted:
+        return
+    if route.request.method == "GET":
+        capture.endpoints[response.url] = {
+            name: value
+            for name, value in route.request.headers.items()
+            if not name.startswith(":") and name.lower() not in _UNREPLAYED_HEADERS
+        }
+    for record in extracted:
+        capture.records[(record.unit_name, record.status)] = record
+    capture.ready.set()
+
+
+async def _wait_for_availability(capture: _PageCapture) -> None:
+    """Wait for the first availability response, then until the responses go quiet."""
+    try:
+        await asyncio.wait_for(capture.ready.wait(), timeout=RESPONSE_WAIT_MS / 1000)
+    except asyncio.TimeoutError:
+        return
+
+    loop = asyncio.get_running_loop()
+    settle_deadline = loop.time() + RESPONSE_SETTLE_MAX_MS / 1000
+    while (remaining := settle_deadline - loop.time()) > 0:
+        capture.ready.clear()
+        try:
+            await asyncio.wait_for(capture.ready.wait(), timeout=min(RESPONSE_QUIET_MS / 1000, remaining))
+        except asyncio.TimeoutError:
+            return
+
+
+async def _scan_one(
+    context: BrowserContext,
+    page_slots: asyncio.Semaphore,
+    request: ScanRequest,
+    settings: SearchSettings,
+    timeout_ms: int,
+) -> list[AvailabilityRecord]:
+    async with page_slots:
+        try:
+            return await _scan_page(context, request, settings, timeout_ms)
+        except PlaywrightError:
+            logger.exception("Browser scan failed for %s; skipping it.", request.name)
+            return []
+
+
+async def _scan_page(context: BrowserContext, request: ScanRequest, settings: SearchSettings, timeout_ms: int) -> list[AvailabilityRecord]:
+    page = await context.new_page()
+    capture = _PageCapture(campground=request.name)
+    await page.route(_AVAIL_URL_RE, partial(_tap_availability, capture))
+
+    try:
+        target_url = build_search_url(request.search_url, settings)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        navigated = False
+        goto_attempts = (("commit", FIRST_GOTO_TIMEOUT_MS), ("domcontentloaded", timeout_ms))
+        for attempt, (wait_until, goto_timeout_ms) in enumerate(goto_attempts):
+            if attempt:
+                capture.reset()
+            try:
+                await page.goto(target_url, wait_until=wait_until, timeout=goto_timeout_ms)
+            except PlaywrightTimeoutError:
+                continue
+            navigated = True
+            break
+
+        if not navigated:
+            logger.warning("Timed out loading %s for %s; using whatever the page has rendered.", target_url, request.name)
+        else:
+            # A committed response says nothing about the app's scripts; give the DOM the rest of
+            # the caller's budget before the availability wait starts.
+            remaining_ms = max(timeout_ms - (loop.time() - started) * 1000, 1)
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+            except PlaywrightTimeoutError:
+                logger.warning("Timed out waiting for the DOM of %s for %s.", target_url, request.name)
 
-            page.on("response", handle_response)
+        await _wait_for_availability(capture)
 
-            target_url = build_search_url(request.search_url, settings)
+        if not capture.records:
             try:
-                page.goto(target_url, wait_until="networkidle", timeout=timeout_ms)
+                await page.wait_for_load_state("networkidle", timeout=TEXT_FALLBACK_IDLE_MS)
             except PlaywrightTimeoutError:
                 pass
 
-            page.wait_for_timeout(3_000)
-
-            unique_records: dict[tuple[str, str], AvailabilityRecord] = {}
-            for record in api_records:
-                key = (record.unit_name, record.status)
-                unique_records[key] = record
-
-            if unique_records:
-                all_records.extend(unique_records.values())
-            else:
-                text = page.inner_text("body")
-                all_records.extend(_extract_from_page_text(text, request.name))
-
-            page.close()
+        if capture.records:
+            if capture.endpoints:
+                _remember_endpoints(target_url, dict(capture.endpoints))
+            return list(capture.records.values())
+
+        text = await page.inner_text("body")
+        return _extract_from_page_text(text, request.name)
+    finally:
+        await page.unroute_all(behavior="ignoreErrors")
+        await page.close()
+
+
+def _remember_endpoints(target_url: str, endpoints: dict[str, dict[str, str]]) -> None:
+    _API_ENDPOINTS[target_url] = endpoints
+    _API_ENDPOINTS.move_to_end(target_url)
+    while len(_API_ENDPOINTS) > MAX_CACHED_SEARCHES:
+        _API_ENDPOINTS.popitem(last=False)
+
+
+async def _scan_one_http(client: httpx.AsyncClient, request: ScanRequest, settings: SearchSettings) -> list[AvailabilityRecord] | None:
+    """Fetch a campground's known availability endpoints directly.
+
+    Returns ``None`` when no endpoint is cached for the search or the endpoint no longer
+    answers with availability JSON, in which case the caller falls back to the browser.
+    """
+    target_url = build_search_url(request.search_url, settings)
+    endpoints = _API_ENDPOINTS.get(target_url)
+    if not endpoints:
+        return None
+
+    try:
+        responses = await asyncio.gather(*(client.get(url, headers=headers) for url, headers in endpoints.items()))
+    except httpx.HTTPError:
+        _API_ENDPOINTS.pop(target_url, None)
+        return None
+
+    unique_records: dict[tuple[str, str], AvailabilityRecord] = {}
+    for url, response in zip(endpoints, responses):
+        if not response.is_success or "application/json" not in response.headers.get("content-type", ""):
+            _API_ENDPOINTS.pop(target_url, None)
+            return None
+        payload = _parse_availability_body(response.content)
+        if payload is None:
+            _API_ENDPOINTS.pop(target_url, None)
+            return None
+
+        for record in _extract_from_json_blob(payload, request.name, url):
+            unique_records[(record.unit_name, record.status)] = record
+
+    if not unique_records:
+        _API_ENDPOINTS.pop(target_url, None)
+        return None
+    _remember_endpoints(target_url, endpoints)
+    return list(unique_records.values())
+
+
+async def _scan_in_browser(
+    browser: Browser,
+    page_slots: asyncio.Semaphore,
+    requests: list[ScanRequest],
+    settings: SearchSettings,
+    timeout_ms: int,
+) -> list[list[AvailabilityRecord]]:
+    context = await browser.new_context(user_agent=USER_AGENT)
+    try:
+        await context.route("**/*", _block_heavy_resources)
+
+        return await asyncio.gather(
+            *(_scan_one(context, page_slots, request, settings, timeout_ms) for request in requests)
+        )
+    finally:
+        await context.unroute_all(behavior="ignoreErrors")
+        await context.close()
+
+
+async def _scan_async(
+    requests: list[ScanRequest],
+    settings: SearchSettings,
+    timeout_ms: int,
+    browser: Browser | None = None,
+    page_slots: asyncio.Semaphore | None = None,
+) -> list[AvailabilityRecord]:
+    http_results: list[list[AvailabilityRecord] | None] = [None] * len(requests)
+    if any(build_search_url(request.search_url, settings) in _API_ENDPOINTS for request in requests):
+        async with httpx.AsyncClient(
+            http2=True,
+            limits=HTTP_LIMITS,
+            timeout=HTTP_TIMEOUT,
+            headers={"User-Agent": USER_AGENT, "Accept": "application/json"},
+        ) as client:
+            http_results = await asyncio.gather(*(_scan_one_http(client, request, settings) for request in requests))
+
+    pending = [request for request, records in zip(requests, http_results) if records is None]
+    browser_results: list[list[AvailabilityRecord]] = []
+    if page_slots is None:
+        page_slots = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+    if pending and browser is not None:
+        browser_results = await _scan_in_browser(browser, page_slots, pending, settings, timeout_ms)
+    elif pending:
+        async with async_playwright() as pw:
+            browser = await pw.chromium.launch(headless=True)
+            browser_results = await _scan_in_browser(browser, page_slots, pending, settings, timeout_ms)
+            await browser.close()
+
+    browser_iter = iter(browser_results)
+    all_records: list[AvailabilityRecord] = []
+    for records in http_results:
+        all_records.extend(records if records is not None else next(browser_iter))
+    return all_records
 
-        browser.close()
 
-    return all_records
+class BrowserSession:
+    """A Chromium instance kept alive across scans.
+
+    Playwright's async objects are bound to the event loop that created them, so the session
+    owns a private loop running on a daemon thread and every scan is submitted to it. The
+    session also owns the page semaphore, so MAX_CONCURRENT_PAGES holds across all scans
+    sharing it rather than per scan.
+    """
+
+    def __init__(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="campscan-browser", daemon=True)
+        self._in_flight: set[concurrent.futures.Future[Any]] = set()
+        self._in_flight_lock = threading.Lock()
+        self._thread.start()
+        try:
+            self._playwright, self.browser, self.page_slots = self.run(self._launch(), SESSION_CALL_TIMEOUT_S)
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    @staticmethod
+    async def _launch() -> tuple[Playwright, Browser, asyncio.Semaphore]:
+        playwright = await async_playwright().start()
+        try:
+            browser = await playwright.chromium.launch(headless=True)
+            return playwright, browser, asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+        except BaseException:
+            await playwright.stop()
+            raise
+
+    def is_connected(self) -> bool:
+        return not self._loop.is_closed() and self.browser.is_connected()
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: float) -> T:
+        """Run ``coro`` on the session loop, cancelling it if it has not finished within ``timeout`` seconds."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        with self._in_flight_lock:
+            self._in_flight.add(future)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Browser session call did not finish within {timeout:.0f}s.") from None
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(future)
+
+    def close(self) -> None:
+        """Cancel scans still running on the session, then shut down Chromium and the loop."""
+        if self._loop.is_closed():
+            return
+        with self._in_flight_lock:
+            in_flight = list(self._in_flight)
+        for future in in_flight:
+            future.cancel()
+        try:
+            with suppress(PlaywrightError, TimeoutError):
+                self.run(self.browser.close(), SESSION_CALL_TIMEOUT_S)
+            with suppress(PlaywrightError, TimeoutError):
+                self.run(self._playwright.stop(), SESSION_CALL_TIMEOUT_S)
+        finally:
+            self._stop_loop()
+
+    @staticmethod
+    async def _drain_tasks() -> None:
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _stop_loop(self) -> None:
+        with suppress(TimeoutError):
+            asyncio.run_coroutine_threadsafe(self._drain_tasks(), self._loop).result(SESSION_CALL_TIMEOUT_S)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def _scan_budget_s(requests: list[ScanRequest], timeout_ms: int) -> float:
+    """Worst-case wall time for a scan whose pages queue on MAX_CONCURRENT_PAGES slots."""
+    page_ms = FIRST_GOTO_TIMEOUT_MS + timeout_ms + RESPONSE_WAIT_MS + RESPONSE_SETTLE_MAX_MS + TEXT_FALLBACK_IDLE_MS
+    waves = -(-len(requests) // MAX_CONCURRENT_PAGES)
+    return HTTP_TIMEOUT.read + 2 * waves * page_ms / 1000
+
+
+def scan_availability(
+    requests: list[ScanRequest],
+    settings: SearchSettings,
+    timeout_ms: int = 45_000,
+    session: BrowserSession | None = None,
+) -> list[AvailabilityRecord]:
+    if session is None:
+        return asyncio.run(_scan_async(requests, settings, timeout_ms))
+    return session.run(
+        _scan_async(requests, settings, timeout_ms, session.browser, session.page_slots),
+        _scan_budget_s(requests, timeout_ms),
+    )
@@ -1,6 +1,28 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
 from datetime import date
 
-from campscan.scanner import SearchSettings, build_search_url, _extract_from_json_blob
+import httpx
+import pytest
+from playwright.async_api import Error as PlaywrightError
+
+from campscan import scanner
+from campscan.scanner import (
+    BrowserSession,
+    ScanRequest,
+    SearchSettings,
+    _deep_iter,
+    _extract_from_json_blob,
+    _PageCapture,
+    _parse_availability_body,
+    _scan_one,
+    _scan_one_http,
+    _wait_for_availability,
+    build_search_url,
+)
 
 
 def test_build_search_url_overrides_query_values():
@@ -24,6 +46,19 @@ def test_build_search_url_overrides_query_values():
     assert "resourceLocationId=123" in built
 
 
+def test_build_search_url_does_not_leak_settings_between_calls():
+    url = "https://reservations.ontarioparks.ca/create-booking/results?resourceLocationId=123"
+    first = SearchSettings(date(2026, 7, 10), date(2026, 7, 12), 4, "-32768", "-32765", nights=2)
+    second = SearchSettings(date(2026, 8, 1), date(2026, 8, 3), 2, "-32768", "-32765")
+
+    build_search_url(url, first)
+    built = build_search_url(url, second)
+
+    assert "startDate=2026-08-01" in built
+    assert "partySize=2" in built
+    assert "nights" not in built
+
+
 def test_extract_from_json_blob_detects_availability_shapes():
     payload = {
         "units": [
@@ -38,3 +73,161 @@ def test_extract_from_json_blob_detects_availability_shapes():
     assert records[0].campground == "Algonquin"
     assert records[0].unit_name == "Site 101"
     assert records[1].status == "Sold Out"
+
+
+def test_deep_iter_yields_nested_dicts_in_document_order():
+    payload = {"id": 1, "children": [{"id": 2, "children": [{"id": 3}]}, {"id": 4}], "tail": {"id": 5}}
+
+    assert [node["id"] for node in _deep_iter(payload)] == [1, 2, 3, 4, 5]
+
+
+def test_extract_from_json_blob_requires_one_exact_case_key():
+    payload = [
+        {"unitName": "Site 303", "Status": "Open"},
+        {"Name": "Loop C", "Status": "Open"},
+    ]
+
+    records = _extract_from_json_blob(payload, "Killbear", "https://example.test/api")
+
+    assert [record.unit_name for record in records] == ["Site 303"]
+
+
+def test_parse_availability_body_skips_unrelated_payloads():
+    assert _parse_availability_body(b'{"locale": "en-CA", "strings": {"title": "Book"}}') is None
+    assert _parse_availability_body(b'{"unitName": "Site 1", "available": tru') is None
+    assert _parse_availability_body(b'[{"siteName": "Site 2", "status": "Open"}]') == [
+        {"siteName": "Site 2", "status": "Open"}
+    ]
+
+
+def test_parse_availability_body_accepts_every_shape_the_extractor_reads():
+    for body in (b'[{"name": "Site 5", "available": true}]', b'{"site": "A12", "status": "Available"}'):
+        payload = _parse_availability_body(body)
+
+        assert payload is not None
+        assert len(_extract_from_json_blob(payload, "Killbear", "https://example.test/api")) == 1
+
+
+def test_scan_one_http_uses_cached_endpoint_and_drops_it_on_html(monkeypatch):
+    settings = SearchSettings(
+        start_date=date(2026, 7, 10),
+        end_date=date(2026, 7, 12),
+        party_size=2,
+        equipment_id="-32768",
+        sub_equipment_id="-32765",
+    )
+    request = ScanRequest(name="Killbear", search_url="https://example.test/results?resourceLocationId=1")
+    target_url = build_search_url(request.search_url, settings)
+    api_url = "https://example.test/api/availability"
+    monkeypatch.setattr(scanner, "_API_ENDPOINTS", OrderedDict({target_url: {api_url: {"x-api-key": "k"}}}))
+
+    def serve_json(http_request: httpx.Request) -> httpx.Response:
+        assert http_request.method == "GET"
+        assert http_request.headers["x-api-key"] == "k"
+        return httpx.Response(200, json={"units": [{"unitName": "Site 7", "available": True}]})
+
+    def serve_html(http_request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, html="<html></html>")
+
+    async def scan(handler):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await _scan_one_http(client, request, settings)
+
+    records = asyncio.run(scan(serve_json))
+    assert [(record.unit_name, record.source) for record in records] == [("Site 7", api_url)]
+
+    assert asyncio.run(scan(serve_html)) is None
+    assert target_url not in scanner._API_ENDPOINTS
+
+
+def test_remember_endpoints_evicts_least_recently_used_search(monkeypatch):
+    monkeypatch.setattr(scanner, "_API_ENDPOINTS", OrderedDict())
+    monkeypatch.setattr(scanner, "MAX_CACHED_SEARCHES", 2)
+
+    scanner._remember_endpoints("search-a", {"api-a": {}})
+    scanner._remember_endpoints("search-b", {"api-b": {}})
+    scanner._remember_endpoints("search-a", {"api-a": {}})
+    scanner._remember_endpoints("search-c", {"api-c": {}})
+
+    assert list(scanner._API_ENDPOINTS) == ["search-a", "search-c"]
+
+
+def test_wait_for_availability_keeps_collecting_until_responses_go_quiet(monkeypatch):
+    monkeypatch.setattr(scanner, "RESPONSE_WAIT_MS", 1_000)
+    monkeypatch.setattr(scanner, "RESPONSE_QUIET_MS", 300)
+    monkeypatch.setattr(scanner, "RESPONSE_SETTLE_MAX_MS", 5_000)
+
+    async def scan():
+        capture = _PageCapture(campground="Algonquin")
+
+        async def deliver_pages():
+            for page_number in range(3):
+                await asyncio.sleep(0.01)
+                capture.endpoints[f"https://example.test/api/availability?page={page_number}"] = {}
+                capture.ready.set()
+
+        delivery = asyncio.create_task(deliver_pages())
+        await _wait_for_availability(capture)
+        collected = len(capture.endpoints)
+        await delivery
+        return collected
+
+    assert asyncio.run(scan()) == 3
+
+
+def test_scan_one_skips_a_campground_whose_browser_scan_fails():
+    class FailingContext:
+        async def new_page(self):
+            raise PlaywrightError("net::ERR_CONNECTION_RESET")
+
+    settings = SearchSettings(date(2026, 7, 10), date(2026, 7, 12), 2, "-32768", "-32765")
+    request = ScanRequest(name="Killbear", search_url="https://example.test/results?resourceLocationId=1")
+
+    async def scan():
+        return await _scan_one(FailingContext(), asyncio.Semaphore(1), request, settings, 1_000)
+
+    assert asyncio.run(scan()) == []
+
+
+class _FakeBrowserSession(BrowserSession):
+    @staticmethod
+    async def _launch():
+        class FakeBrowser:
+            async def close(self):
+                pass
+
+            async def stop(self):
+                pass
+
+            def is_connected(self):
+                return True
+
+        fake = FakeBrowser()
+        return fake, fake, asyncio.Semaphore(1)
+
+
+def test_browser_session_run_times_out_and_close_releases_waiting_scans():
+    session = _FakeBrowserSession()
+
+    with pytest.raises(TimeoutError):
+        session.run(asyncio.sleep(10), timeout=0.05)
+
+    outcome = []
+
+    def scan():
+        try:
+            session.run(asyncio.sleep(3600), timeout=60)
+        except concurrent.futures.CancelledError:
+            outcome.append("cancelled")
+
+    caller = threading.Thread(target=scan)
+    caller.start()
+    while not session._in_flight:
+        time.sleep(0.01)
+
+    session.close()
+    caller.join(timeout=5)
+
+    assert not caller.is_alive()
+    assert outcome == ["cancelled"]
+    assert not session.is_connected()